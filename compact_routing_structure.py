@@ -4,7 +4,10 @@ import math
 from fractions import Fraction
 
 from point import Point
-from utils import angle, check_rectangle_arc_intersection, distance, normalize_angle, on_segment, orientation
+from utils import angle, check_rectangle_arc_intersection, distance, normalize_angle, on_segment, orientation, \
+    segment_point_distance
+
+split_time_margin = 1e-9  # The relative margin on the lower bound of split times for floating-point rounding errors
 
 
 class StraightBundle:
@@ -35,7 +38,7 @@ class StraightBundle:
 
         :param eb: an ElbowBundle object
         """
-        return self.left == eb or self.right == eb
+        return self.left is eb or self.right is eb
 
     def next(self, prev_eb):
         """
@@ -121,7 +124,7 @@ class StraightBundle:
 
         # Compute the angle of rotation beta between line segments pq and p'q' using a and b
         # If the elbow bundles have the same orientation, they are on the same 'side' of the straight bundle
-        if not (eb_left.right == self) ^ (eb_right.left == self):
+        if not (eb_left.right is self) ^ (eb_right.left is self):
             beta = Fraction(math.asin(abs(b - a) / d_pq))
         # Otherwise, the elbow bundles are on different sides of the straight bundle
         else:
@@ -129,7 +132,7 @@ class StraightBundle:
 
         # Compute the angle of line segment p'q' using alpha and beta
         # Case 1: the elbow bundles have the same orientation as the straight bundle
-        if eb_left.right == self and eb_right.left == self:
+        if eb_left.right is self and eb_right.left is self:
             # If a < b, the rotation is counterclockwise
             if a < b:
                 ang = alpha + beta
@@ -137,7 +140,7 @@ class StraightBundle:
             else:
                 ang = alpha - beta
         # Case 2: the elbow bundles have the same orientation but different from the straight bundle
-        elif eb_left.left == self and eb_right.right == self:
+        elif eb_left.left is self and eb_right.right is self:
             # If a < b, the rotation is clockwise
             if a < b:
                 ang = alpha - beta
@@ -146,7 +149,7 @@ class StraightBundle:
                 ang = alpha + beta
         # Case 3: the elbow bundles have different orientations but eb_left has the same as the straight bundle
         # Then, the rotation is clockwise
-        elif eb_left.right == self and eb_right.right == self:
+        elif eb_left.right is self and eb_right.right is self:
             ang = alpha - beta
         # Case 4: the elbow bundles have different orientations but eb_right has the same as the straight bundle
         # Then, the rotation is counterclockwise
@@ -179,7 +182,7 @@ class StraightBundle:
         # If eb_left is a terminal elbow, p1 is the left point of the backbone
         # Otherwise, eb_left bends around p1, and we translate p1 based on sb_angle and separating thickness
         if not eb_left.is_terminal:
-            if eb_left.right == self:
+            if eb_left.right is self:
                 eb_left_angle = sb_angle + rotation
             else:
                 eb_left_angle = sb_angle - rotation
@@ -191,7 +194,7 @@ class StraightBundle:
         # If eb_right is a terminal elbow, p2 is the right point of the backbone
         # Otherwise, eb_right bends around p2, and we translate p2 based on sb_angle and separating thickness
         if not eb_right.is_terminal:
-            if eb_right.left == self:
+            if eb_right.left is self:
                 eb_right_angle = sb_angle + rotation
             else:
                 eb_right_angle = sb_angle - rotation
@@ -242,6 +245,22 @@ class StraightBundle:
         """
         return eb.splits(self, t)
 
+    def get_min_split_time(self, eb):
+        """
+        Returns a lower bound on the time at which the straight bundle can get split by the given elbow bundle.
+
+        :param eb: an ElbowBundle object
+        """
+        return eb.get_min_split_time(self)
+
+    def split_candidates(self, crs):
+        """
+        Returns the bundles of the given compact routing structure that may split with the straight bundle.
+
+        :param crs: a CompactRoutingStructure object
+        """
+        return crs.elbow_bundles
+
     def __str__(self):
         return f"{self.left} -> {self.right}"
 
@@ -271,7 +290,7 @@ class ElbowBundle:
 
         :param sb: a StraightBundle object
         """
-        return self.left == sb or self.right == sb
+        return self.left is sb or self.right is sb
 
     def next(self, prev_sb):
         """
@@ -284,6 +303,14 @@ class ElbowBundle:
 
         return self.right if self.left == prev_sb else self.left
 
+    def split_candidates(self, crs):
+        """
+        Returns the bundles of the given compact routing structure that may split with the elbow bundle.
+
+        :param crs: a CompactRoutingStructure object
+        """
+        return crs.straight_bundles
+
     def is_closer_than(self, eb):
         """
         Determines whether the elbow bundle is closer to its associated point than the given elbow bundle eb.
@@ -421,6 +448,32 @@ class ElbowBundle:
 
         return check_rectangle_arc_intersection(p1, p2, p3, p4, center, radius, left_angle, right_angle, True)
 
+    def get_min_split_time(self, sb):
+        """
+        Returns a lower bound on the time at which the elbow bundle can split the given straight bundle.
+        Before this time, splits(sb, t) is False for every t, so the growing algorithm may skip evaluating it.
+
+        :param sb: a StraightBundle object
+        """
+        # At time t, the backbone endpoints of sb are translated by at most t * offset from the points of its elbows
+        # The rectangle of sb then lies within distance t * (offset + sb.thickness / 2) of the thin straight bundle
+        offset = 0
+        for eb in [sb.left, sb.right]:
+            if not eb.is_terminal:
+                offset = max(offset, eb.layer_thickness + sb.thickness / 2)
+        sb_growth = offset + sb.thickness / 2
+
+        # At time t, the arc of the elbow bundle lies within distance t * eb_growth of its point
+        thickness = self.thickness / 2 if self.is_terminal else self.thickness
+        eb_growth = self.layer_thickness + thickness
+
+        # The rectangle and arc cannot intersect as long as their total growth is less than their initial distance
+        growth = float(sb_growth + eb_growth)
+        if growth <= 0:
+            return math.inf
+
+        return segment_point_distance(sb.left.point, sb.right.point, self.point) / growth * (1 - split_time_margin)
+
     def merges(self, t):
         """
         Determines whether the elbow bundle merges with its adjacent straight bundles at the given time t.
@@ -441,7 +494,7 @@ class ElbowBundle:
         p3, p4 = sb_right.get_backbone_endpoints(t)
 
         # Set a and b equal to the endpoints of the backbone of sb_left such that a -> b is directed towards the elbow
-        if sb_left.right.point == self.point:
+        if sb_left.right.point is self.point:
             a = p1
             b = p2
         else:
@@ -449,7 +502,7 @@ class ElbowBundle:
             b = p1
 
         # Set c equal to the endpoint of the backbone of sb_right that is furthest from the elbow
-        if sb_right.left.point == self.point:
+        if sb_right.left.point is self.point:
             c = p4
         else:
             c = p3
@@ -1,10 +1,12 @@
-from utils import distance
+import math
 
 
 class Constraint:
     """
     A minimum-separation constraint on two points.
     """
+    __slots__ = ('p1', 'p2', 'min_separation')
+
     def __init__(self, p1, p2, min_sep):
         """
         :param p1: a Point object
@@ -20,7 +22,15 @@ class Constraint:
         """
         Returns the conflict value of the constraint.
         """
-        return max(0, self.min_separation - distance(self.p1, self.p2))
+        # A non-positive minimum separation is always satisfied, so we can skip computing the distance
+        if self.min_separation <= 0:
+            return 0
+
+        # Compute the squared distance with the coordinate differences inlined, and take a single square root
+        dx = self.p2.x - self.p1.x
+        dy = self.p2.y - self.p1.y
+
+        return max(0, self.min_separation - math.sqrt(dx * dx + dy * dy))
 
     def __str__(self):
         return f"d({self.p1}, {self.p2}) >= {self.min_separation}"
@@ -1,18 +1,33 @@
 import copy
 import math
+import os
 from fractions import Fraction
+from functools import lru_cache
 import gurobipy as gp
+import numpy as np
+import scipy.sparse as sp
 
 from constraint import Constraint
 from graph import Vertex
 from obstacle_displacer import Objective, ObstacleDisplacer
-from point import Point
-from utils import vector_length
 
 approx_factor = 1.998  # The approximation factor of the Delaunay constraints
 min_coordinate_diff = 1  # The minimum required x- and y-difference between pairs of points sharing a Delaunay edge
 
 
+@lru_cache(maxsize=None)
+def get_gurobi_env():
+    """
+    Returns the Gurobi environment shared by all models, with all Gurobi output suppressed.
+    The environment is only started on the first call, as starting it is expensive.
+    """
+    env = gp.Env(empty=True)
+    env.setParam("OutputFlag", 0)
+    env.start()
+
+    return env
+
+
 class DelaunayDisplacer(ObstacleDisplacer):
     """
     A displacement method that computes a 1.998√2-approximation of the new optimal obstacle positions.
@@ -28,16 +43,26 @@ class DelaunayDisplacer(ObstacleDisplacer):
         """
         Initializes the Gurobi model with constraints to compute displacements and objective function.
         """
-        # Create environment to suppress all Gurobi output
-        env = gp.Env(empty=True)
-        env.setParam("OutputFlag", 0)
-        env.start()
+        # Free the previous model, if any, and create the new one in the shared environment
+        if self.model is not None:
+            self.model.dispose()
+
+        self.model = gp.Model("Delaunay displacer", env=get_gurobi_env())
 
-        self.model = gp.Model("Delaunay displacer", env=env)
+        # Tune the solver for the repeated re-solves of the linear program
+        # The barrier method is usually fastest for the dense Delaunay constraints
+        # Crossover must stay enabled, as interior solutions may slightly violate the separation constraints
+        # LPWarmStart is only used when Gurobi falls back to simplex after adding new constraints
+        self.model.setParam("Method", 2)
+        self.model.setParam("Presolve", 1)
+        self.model.setParam("Threads", os.cpu_count())
+        self.model.setParam("LPWarmStart", 2)
 
         # C_δ contains for each side of the unit circle of δ, the point closest to the origin
-        # We use δ = L_∞ (maximum metric)
-        C_delta = [Point(-1, 0), Point(0, 1), Point(1, 0), Point(0, -1)]
+        # We use δ = L_∞ (maximum metric), for which these are the unit vectors (-1, 0), (0, 1), (1, 0) and (0, -1)
+        # Since ||c|| = 1 for each c in C_δ, normalizing c by ||c||^2 leaves it unchanged
+        C_delta_xs = np.array([-1.0, 0.0, 1.0, 0.0])
+        C_delta_ys = np.array([0.0, 1.0, 0.0, -1.0])
 
         # Determine the set of points to be displaced
         if self.displace_vertices:
@@ -45,37 +70,34 @@ class DelaunayDisplacer(ObstacleDisplacer):
         else:
             displaced_points = self.instance.obstacles
 
-        self.new_xs, self.new_ys = [], []
-        displacements = []
-
-        # Add constraints to compute values of displacements
-        for p in displaced_points:
-            # Create variables for new x- and y-coordinates of the point
-            new_x = self.model.addVar(lb=-gp.GRB.INFINITY)
-            new_y = self.model.addVar(lb=-gp.GRB.INFINITY)
-            self.new_xs.append(new_x)
-            self.new_ys.append(new_y)
-
-            # Add variable equal to displacement δ_i
-            displacement = self.model.addVar()
-            displacements.append(displacement)
-
-            # Compute x- and y-difference
-            dx = new_x - float(p.x)
-            dy = new_y - float(p.y)
-
-            # Add constraints such that δ_i >= c * (o'_i - o_i) / ||c||^2 for all c in C_δ
-            # Since δ_i is equal to the max over these values and we minimize in the objective, δ_i is equal to the max
-            for c in C_delta:
-                x_normalized = c.x / (vector_length(c) ** 2)
-                y_normalized = c.y / (vector_length(c) ** 2)
-
-                self.model.addConstr(displacement >= x_normalized * dx + y_normalized * dy)
-
-        # Add variable equal to objective to be minimized
+        # Create variables for the new x- and y-coordinates and the displacement δ_i of each point at once
+        no_points = len(displaced_points)
+        new_xs = self.model.addMVar(no_points, lb=-gp.GRB.INFINITY)
+        new_ys = self.model.addMVar(no_points, lb=-gp.GRB.INFINITY)
+        displacements = self.model.addMVar(no_points)
+        self.new_xs, self.new_ys = new_xs.tolist(), new_ys.tolist()
+
+        # Add constraints such that δ_i >= c * (o'_i - o_i) / ||c||^2 for all c in C_δ
+        # Since δ_i is equal to the max over these values and we minimize in the objective, δ_i is equal to the max
+        # The constraints are added at once as a sparse matrix on the variables (x'_i, y'_i, δ_i), grouped per point
+        xs = np.array([float(p.x) for p in displaced_points])
+        ys = np.array([float(p.y) for p in displaced_points])
+
+        # Row 4i + k of the matrix is δ_i - c_k.x * x'_i - c_k.y * y'_i >= -c_k.x * x_i - c_k.y * y_i
+        no_rows = no_points * len(C_delta_xs)
+        rows = np.repeat(np.arange(no_rows), 3)
+        point_indices = np.repeat(np.arange(no_points), len(C_delta_xs))
+        columns = np.stack([point_indices, no_points + point_indices, 2 * no_points + point_indices], axis=1).ravel()
+        values = np.stack([-np.tile(C_delta_xs, no_points), -np.tile(C_delta_ys, no_points), np.ones(no_rows)],
+                          axis=1).ravel()
+        A = sp.csr_matrix((values, (rows, columns)), shape=(no_rows, 3 * no_points))
+        b = -np.outer(xs, C_delta_xs).ravel() - np.outer(ys, C_delta_ys).ravel()
+
+        self.model.addMConstr(A, gp.MVar.fromlist(self.new_xs + self.new_ys + displacements.tolist()), '>', b)
+
+        # Construct the objective to be minimized directly as a linear expression, without an auxiliary variable
         if self.objective == Objective.TOTAL:
-            obj = self.model.addVar()
-            self.model.addConstr(obj == gp.quicksum(displacements))
+            obj = displacements.sum()
         else:
             raise Exception(f"Objective {self.objective.name} not implemented for DelaunayDisplacer")
 
@@ -97,7 +119,19 @@ class DelaunayDisplacer(ObstacleDisplacer):
             for he in half_edges:
                 he.constraint = None
 
+        # Collect the thicknesses of the edges crossing each Delaunay edge in one pass over the crossing sequences
+        # A Delaunay edge is identified by the lowest index of its two half-edges
+        crossing_thicknesses = {}
+        for edge in self.instance.graph.edges:
+            for crossing in edge.crossing_sequence.sequence:
+                key = crossing.index if crossing.twin is None else min(crossing.index, crossing.twin.index)
+                crossing_thicknesses.setdefault(key, []).append(edge.thickness)
+
+        # The bounding box points are compared by identity, as they are the same objects as the points of the DT
+        bbox_point_ids = {id(p) for p in self.instance.homotopy.bbox_points}
+
         # Add a minimum-separation constraint on each Delaunay edge
+        new_constraints = []
         while half_edges:
             he = half_edges.pop()
 
@@ -106,7 +140,7 @@ class DelaunayDisplacer(ObstacleDisplacer):
                 continue
 
             # Do not add constraints for bounding box points
-            if he.origin in self.instance.homotopy.bbox_points or he.target in self.instance.homotopy.bbox_points:
+            if id(he.origin) in bbox_point_ids or id(he.target) in bbox_point_ids:
                 continue
 
             # Do not add constraints on pairs of vertices if them may not be displaced
@@ -126,78 +160,111 @@ class DelaunayDisplacer(ObstacleDisplacer):
             if he.twin is not None:
                 he.twin.constraint = con
 
-            for edge in self.instance.graph.edges:
-                # Iterate over all crossings and update the constraint on he
-                for crossing in edge.crossing_sequence.sequence:
-                    if crossing is he or crossing is he.twin:
-                        con.min_separation += approx_factor * edge.thickness
+            # Update the constraint on he for each edge crossing it
+            key = he.index if he.twin is None else min(he.index, he.twin.index)
+            for thickness in crossing_thicknesses.get(key, []):
+                con.min_separation += approx_factor * thickness
 
             # Add minimum-separation constraint
             self.constraints.append(con)
+            new_constraints.append(con)
 
-            # Add corresponding constraints to model
-            self.add_constraints_to_model(con)
+        # Add corresponding constraints to model
+        self.add_constraints_to_model(new_constraints)
 
-    def add_constraints_to_model(self, constraint):
+    def get_variable_index(self, p):
         """
-        Adds the given minimum-separation constraint and corresponding orthogonality constraints to the Gurobi model.
+        Returns the index of the variables for the new position of the given point.
 
-        :param constraint: a Constraint object
+        :param p: a Point object
+        :returns: the index in new_xs and new_ys, or None if the point may not be displaced
         """
-        # Retrieve variables for new position of p1
-        i = constraint.p1.id
-        if isinstance(constraint.p1, Vertex):
+        if isinstance(p, Vertex):
             if self.displace_vertices:
-                i += len(self.instance.obstacles)
-                x1 = self.new_xs[i]
-                y1 = self.new_ys[i]
+                return p.id + len(self.instance.obstacles)
             else:
-                x1 = constraint.p1.x
-                y1 = constraint.p1.y
+                return None
         else:
-            x1 = self.new_xs[i]
-            y1 = self.new_ys[i]
+            return p.id
 
-        # Retrieve variables for new position of p2
-        j = constraint.p2.id
-        if isinstance(constraint.p2, Vertex):
-            if self.displace_vertices:
-                j += len(self.instance.obstacles)
-                x2 = self.new_xs[j]
-                y2 = self.new_ys[j]
-            else:
-                x2 = constraint.p2.x
-                y2 = constraint.p2.y
-        else:
-            x2 = self.new_xs[j]
-            y2 = self.new_ys[j]
-
-        # Add orthogonality constraint on the x-coordinates
-        if constraint.p1.x == constraint.p2.x:
-            self.model.addConstr(x1 == x2)
-            dx = 0
-        elif constraint.p1.x < constraint.p2.x:
-            self.model.addConstr(x1 <= x2 - min_coordinate_diff)
-            dx = x2 - x1
-        else:
-            self.model.addConstr(x1 >= x2 + min_coordinate_diff)
-            dx = x1 - x2
-
-        # Add orthogonality constraint on the y-coordinates
-        if constraint.p1.y == constraint.p2.y:
-            self.model.addConstr(y1 == y2)
-            dy = 0
-        elif constraint.p1.y < constraint.p2.y:
-            self.model.addConstr(y1 <= y2 - min_coordinate_diff)
-            dy = y2 - y1
-        else:
-            self.model.addConstr(y1 >= y2 + min_coordinate_diff)
-            dy = y1 - y2
+    def add_constraints_to_model(self, constraints):
+        """
+        Adds the given minimum-separation constraints and corresponding orthogonality constraints to the Gurobi model.
+        All constraints are added at once as a sparse matrix on the variables for the new x- and y-coordinates.
 
-        # Add minimum-separation constraint using the Manhattan distance
-        # The Manhattan distance overestimates the Euclidean distance by a factor √2
-        # Therefore, we need to scale the min separation by an extra factor √2, on top of the 1.998 approx factor
-        self.model.addConstr(dx + dy >= math.sqrt(2) * constraint.min_separation)
+        :param constraints: a list of Constraint objects
+        """
+        no_variables = len(self.new_xs)
+        rows, columns, values, senses, rhs = [], [], [], [], []
+
+        def add_term(column, value, coordinate):
+            """
+            Adds the given term to the current row, or subtracts it from its right-hand side if the point is fixed.
+            """
+            if column is None:
+                rhs[-1] -= value * float(coordinate)
+            else:
+                rows.append(len(rhs) - 1)
+                columns.append(column)
+                values.append(value)
+
+        for constraint in constraints:
+            # Get the columns of the variables for the new coordinates of p1 and p2, which are None if they are fixed
+            x1 = self.get_variable_index(constraint.p1)
+            x2 = self.get_variable_index(constraint.p2)
+            y1 = x1 + no_variables if x1 is not None else None
+            y2 = x2 + no_variables if x2 is not None else None
+
+            # Add orthogonality constraint on the x-coordinates, with row x1 - x2 (= 0 | <= -diff | >= diff)
+            # The sign of the x-difference in the minimum-separation constraint follows from it
+            if constraint.p1.x == constraint.p2.x:
+                senses.append('=')
+                rhs.append(0)
+                sign_x = 0
+            elif constraint.p1.x < constraint.p2.x:
+                senses.append('<')
+                rhs.append(-min_coordinate_diff)
+                sign_x = 1
+            else:
+                senses.append('>')
+                rhs.append(min_coordinate_diff)
+                sign_x = -1
+            add_term(x1, 1, constraint.p1.x)
+            add_term(x2, -1, constraint.p2.x)
+
+            # Add orthogonality constraint on the y-coordinates, with row y1 - y2 (= 0 | <= -diff | >= diff)
+            if constraint.p1.y == constraint.p2.y:
+                senses.append('=')
+                rhs.append(0)
+                sign_y = 0
+            elif constraint.p1.y < constraint.p2.y:
+                senses.append('<')
+                rhs.append(-min_coordinate_diff)
+                sign_y = 1
+            else:
+                senses.append('>')
+                rhs.append(min_coordinate_diff)
+                sign_y = -1
+            add_term(y1, 1, constraint.p1.y)
+            add_term(y2, -1, constraint.p2.y)
+
+            # Add minimum-separation constraint using the Manhattan distance |x2 - x1| + |y2 - y1|
+            # The Manhattan distance overestimates the Euclidean distance by a factor √2
+            # Therefore, we need to scale the min separation by an extra factor √2, on top of the 1.998 approx factor
+            senses.append('>')
+            rhs.append(math.sqrt(2) * constraint.min_separation)
+            if sign_x != 0:
+                add_term(x2, sign_x, constraint.p2.x)
+                add_term(x1, -sign_x, constraint.p1.x)
+            if sign_y != 0:
+                add_term(y2, sign_y, constraint.p2.y)
+                add_term(y1, -sign_y, constraint.p1.y)
+
+        if not rhs:
+            return
+
+        A = sp.csr_matrix((values, (rows, columns)), shape=(len(rhs), 2 * no_variables))
+        self.model.addMConstr(A, gp.MVar.fromlist(self.new_xs + self.new_ys), np.array(senses), np.array(rhs))
 
     def displace_obstacles(self):
         """
@@ -212,11 +279,15 @@ class DelaunayDisplacer(ObstacleDisplacer):
         if self.model.Status == gp.GRB.OPTIMAL:
             # The model was solved optimally
 
+            # Query the computed coordinates of all points at once, in the order of the variables
+            new_xs = self.model.getAttr("X", self.new_xs)
+            new_ys = self.model.getAttr("X", self.new_ys)
+
             # Assign computed positions to obstacles
             for i in range(len(self.instance.obstacles)):
                 o = self.instance.obstacles[i]
-                o.x = Fraction(self.new_xs[i].X)
-                o.y = Fraction(self.new_ys[i].X)
+                o.x = Fraction(new_xs[i])
+                o.y = Fraction(new_ys[i])
 
             if self.displace_vertices:
                 # Assign computed positions to vertices
@@ -224,8 +295,8 @@ class DelaunayDisplacer(ObstacleDisplacer):
                     index = i + len(self.instance.obstacles)
 
                     v = self.instance.graph.vertices[i]
-                    v.x = Fraction(self.new_xs[index].X)
-                    v.y = Fraction(self.new_ys[index].X)
+                    v.x = Fraction(new_xs[index])
+                    v.y = Fraction(new_ys[index])
 
             return self.model.ObjVal
         else:
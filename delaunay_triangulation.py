@@ -1,13 +1,173 @@
+from functools import lru_cache
+
 import numpy as np
+from numba import njit
 from scipy.spatial import Delaunay
 
-from utils import check_segment_segment_intersection, orientation, get_circle, in_circle, on_segment
+from utils import (check_segment_segment_intersection, orientation, orientation_filter, get_circle, in_circle,
+                   on_segment)
+
+in_circle_tolerance = 1e-10  # The relative tolerance of the in-circle filter, such that no violation is missed
+qhull_options = "Qbb Qc Qz Q12"  # The options passed to Qhull to compute the Delaunay triangulation
+delaunay_cache_size = 8  # The number of recently computed Delaunay triangulations to keep in memory
+
+
+@lru_cache(maxsize=delaunay_cache_size)
+def compute_simplices(coordinate_bytes, no_points):
+    """
+    Computes the triangles of the Delaunay triangulation on a set of points using Qhull.
+    The result is cached, as the same instance is often triangulated repeatedly over multiple runs.
+
+    :param coordinate_bytes: the raw bytes of an (n, 2) float array with the coordinates of the points
+    :param no_points: the number of points n
+    :returns: a read-only (m, 3) array with the point indices of each triangle
+    """
+    coordinates = np.frombuffer(coordinate_bytes).reshape(no_points, 2)
+    dt = Delaunay(coordinates, incremental=False, qhull_options=qhull_options)
+
+    simplices = dt.simplices.astype(np.int64)
+    simplices.setflags(write=False)
+
+    return simplices
+
+
+@njit(cache=True)
+def find_non_delaunay_candidate(triangle_vertices, opposite_vertices, coordinates, start):
+    """
+    Finds the first triangle from index start onwards that may not satisfy the Delaunay condition.
+    Uses a floating-point in-circle determinant with a tolerance, so the result must be verified exactly.
+
+    :param triangle_vertices: an (m, 3) array with the point indices of each triangle
+    :param opposite_vertices: an (m, 3) array with the index of the point opposite to each half-edge, or -1 if none
+    :param coordinates: an (n, 2) array with the coordinates of the points
+    :param start: the index of the first triangle to check
+    :returns: the index of the candidate triangle, or -1 if all triangles satisfy the Delaunay condition
+    """
+    for t in range(start, triangle_vertices.shape[0]):
+        ax, ay = coordinates[triangle_vertices[t, 0]]
+        bx, by = coordinates[triangle_vertices[t, 1]]
+        cx, cy = coordinates[triangle_vertices[t, 2]]
+
+        # Collinear triangles are never Delaunay
+        orient = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        if orient == 0:
+            return t
+
+        for j in range(3):
+            d = opposite_vertices[t, j]
+            if d < 0:
+                continue
+
+            dx, dy = coordinates[d]
+            adx, ady = ax - dx, ay - dy
+            bdx, bdy = bx - dx, by - dy
+            cdx, cdy = cx - dx, cy - dy
+            alift = adx * adx + ady * ady
+            blift = bdx * bdx + bdy * bdy
+            clift = cdx * cdx + cdy * cdy
+
+            # The determinant is positive if d lies inside the circumcircle of the counterclockwise triangle abc
+            det = (alift * (bdx * cdy - cdx * bdy)
+                   + blift * (cdx * ady - adx * cdy)
+                   + clift * (adx * bdy - bdx * ady))
+            permanent = (alift * (abs(bdx * cdy) + abs(cdx * bdy))
+                         + blift * (abs(cdx * ady) + abs(adx * cdy))
+                         + clift * (abs(adx * bdy) + abs(bdx * ady)))
+
+            if orient < 0:
+                det = -det
+
+            if det > -in_circle_tolerance * permanent:
+                return t
+
+    return -1
+
+
+@njit(cache=True)
+def triangle_exit_filter(triangle_vertices, coordinates, t, px, py, qx, qy):
+    """
+    Determines which half-edge of triangle t is crossed by directed line segment pq towards the outside.
+    Uses the floating-point orientation filter, where half-edge j is directed from corner j to corner (j + 1) % 3.
+
+    :param triangle_vertices: an (m, 3) array with the point indices of each triangle
+    :param coordinates: an (n, 2) array with the coordinates of the points
+    :param t: the index of the triangle
+    :returns: the index of the crossed half-edge, -1 if pq does not exit the triangle, or -2 if it is uncertain
+    """
+    ax, ay = coordinates[triangle_vertices[t, 0]]
+    bx, by = coordinates[triangle_vertices[t, 1]]
+    cx, cy = coordinates[triangle_vertices[t, 2]]
+
+    # If the bounding boxes of pq and the triangle are strictly disjoint, pq cannot cross any of its half-edges
+    # Rounding to floats preserves the order of the coordinates, so this also holds for the exact coordinates
+    if (max(px, qx) < min(ax, bx, cx) or min(px, qx) > max(ax, bx, cx)
+            or max(py, qy) < min(ay, by, cy) or min(py, qy) > max(ay, by, cy)):
+        return -1
+
+    for j in range(3):
+        ox, oy = coordinates[triangle_vertices[t, j]]
+        tx, ty = coordinates[triangle_vertices[t, (j + 1) % 3]]
+
+        o_p = orientation_filter(ox, oy, tx, ty, px, py)
+        o_q = orientation_filter(ox, oy, tx, ty, qx, qy)
+        if o_p == -1 or o_q == -1:
+            return -2
+
+        # Segment pq can only exit via the half-edge if p is on its left and q is on its right
+        if o_p == 2 and o_q == 1:
+            o_o = orientation_filter(px, py, qx, qy, ox, oy)
+            o_t = orientation_filter(px, py, qx, qy, tx, ty)
+            if o_o == -1 or o_t == -1:
+                return -2
+
+            if o_o != o_t:
+                return j
+
+    return -1
+
+
+@njit(cache=True)
+def walk_filter(triangle_vertices, triangle_half_edges, half_edge_twins, half_edge_triangles, coordinates, t, px, py,
+                qx, qy, crossings):
+    """
+    Walks from triangle t along directed line segment pq, recording the crossed half-edges as long as they are certain.
+    Uses the floating-point exit filter, so the walk stops at the first triangle whose exit is uncertain.
+
+    :param triangle_vertices: an (m, 3) array with the point indices of each triangle
+    :param triangle_half_edges: an (m, 3) array with the half-edge indices of each triangle
+    :param half_edge_twins: an array with the index of the twin of each half-edge, or -1 if none
+    :param half_edge_triangles: an array with the index of the triangle of each half-edge
+    :param coordinates: an (n, 2) array with the coordinates of the points
+    :param t: the index of the triangle to start from
+    :param crossings: an array in which the indices of the crossed half-edges are recorded
+    :returns: the number of recorded crossings, the index of the last triangle reached, and whether pq certainly
+              does not exit the last triangle
+    """
+    no_crossings = 0
+    while True:
+        j = triangle_exit_filter(triangle_vertices, coordinates, t, px, py, qx, qy)
+        if j == -1:
+            return no_crossings, t, True
+        elif j == -2:
+            return no_crossings, t, False
+
+        # Leave half-edges without a twin to be handled exactly
+        he = triangle_half_edges[t, j]
+        twin = half_edge_twins[he]
+        if twin < 0:
+            return no_crossings, t, False
+
+        crossings[no_crossings] = he
+        no_crossings += 1
+        t = half_edge_triangles[twin]
 
 
 class HalfEdge:
     """
     A half-edge connecting two Delaunay points, contained within the triangle on its left-hand side.
     """
+    __slots__ = ('origin', 'target', 'dx', 'dy', 'twin', 'next', 'prev', 'triangle', 'index', 'constraint')
+
     def __init__(self, origin, target):
         """
         :param origin: a Point object, specifying the origin of the half-edge
@@ -15,13 +175,25 @@ class HalfEdge:
         """
         self.origin = origin
         self.target = target
+        self.dx = None  # The x-difference from origin to target
+        self.dy = None  # The y-difference from origin to target
         self.twin = None  # The reverse half-edge directed from target to origin
         self.next = None  # The next half-edge along the same triangle
         self.prev = None  # The previous half-edge along the same triangle
         self.triangle = None  # The triangle containing the half-edge
+        self.index = None  # The index of the half-edge in a Delaunay triangulation
 
         self.constraint = None  # The minimum-separation constraint on the two points
 
+        self.update_direction()
+
+    def update_direction(self):
+        """
+        Updates the direction of the half-edge, which is required after changing or moving its origin or target.
+        """
+        self.dx = self.target.x - self.origin.x
+        self.dy = self.target.y - self.origin.y
+
     def orientation(self, p):
         """
         Determines the orientation of point p with respect to the half-edge.
@@ -29,7 +201,23 @@ class HalfEdge:
         :param p: a Point object
         :returns: 0 : collinear, 1 : clockwise, 2 : counterclockwise
         """
-        return orientation(self.origin, self.target, p)
+        o = orientation_filter(float(self.origin.x), float(self.origin.y), float(self.target.x), float(self.target.y),
+                               float(p.x), float(p.y))
+        if o != -1:
+            return o
+
+        # If the orientation is uncertain, compute it exactly using the direction of the half-edge
+        val = self.dy * (p.x - self.target.x) - self.dx * (p.y - self.target.y)
+
+        if val > 0:
+            # Clockwise orientation
+            return 1
+        elif val < 0:
+            # Counterclockwise orientation
+            return 2
+        else:
+            # Collinear orientation
+            return 0
 
     def intersects(self, p, q):
         """
@@ -38,7 +226,17 @@ class HalfEdge:
         :param p: a Point object
         :param q: a Point object
         """
-        return check_segment_segment_intersection(self.origin, self.target, p, q)
+        o1 = self.orientation(p)
+        o2 = self.orientation(q)
+        o3 = orientation(p, q, self.origin)
+        o4 = orientation(p, q, self.target)
+
+        # If no three points are collinear, the segments intersect if and only if they separate each other's endpoints
+        # Otherwise, check the collinear special cases
+        if o1 != 0 and o2 != 0 and o3 != 0 and o4 != 0:
+            return o1 != o2 and o3 != o4
+        else:
+            return check_segment_segment_intersection(self.origin, self.target, p, q)
 
     def flip(self):
         """
@@ -62,6 +260,8 @@ class HalfEdge:
         self.target = point_t1
         self.twin.origin = point_t1
         self.twin.target = point_t2
+        self.update_direction()
+        self.twin.update_direction()
 
         # Set new next and prev
         he_next = self.next
@@ -100,7 +300,8 @@ class HalfEdge:
         if self is None or other is None:
             return False
 
-        return self.origin == other.origin and self.target == other.target
+        # The points of the triangulation are distinct objects, so comparing them by identity suffices
+        return self.origin is other.origin and self.target is other.target
 
     def __str__(self):
         return f"{self.origin} -> {self.target}"
@@ -110,8 +311,17 @@ class Triangle:
     """
     A triangle of the Delaunay triangulation.
     """
-    def __init__(self):
-        self.half_edges = []  # Set of half-edges forming the triangle
+    __slots__ = ('triangulation', 'index', 'half_edges')
+
+    def __init__(self, triangulation, index, half_edges):
+        """
+        :param triangulation: the DelaunayTriangulation object containing the triangle
+        :param index: the index of the triangle in the Delaunay triangulation
+        :param half_edges: the list of three HalfEdge objects forming the triangle
+        """
+        self.triangulation = triangulation
+        self.index = index
+        self.half_edges = half_edges  # Set of half-edges forming the triangle
 
     def get_points(self):
         """
@@ -129,20 +339,6 @@ class Triangle:
 
         return p, q, r
 
-    def get_edge(self, origin, target):
-        """
-        Returns the half-edge of the triangle with given origin and target.
-
-        :param origin: a Point object
-        :param target: a Point object
-        :returns: the half-edge from origin to target, or None if it is not part of the triangle
-        """
-        for he in self.half_edges:
-            if he.origin is origin and he.target is target:
-                return he
-
-        return None
-
     def exited_by(self, p, q):
         """
         Determines whether directed line segment pq exits the triangle.
@@ -152,11 +348,29 @@ class Triangle:
         :param q: a Point object
         :returns: the crossed half-edge (either if crossed in a vertex), or None if pq does not exit the triangle
         """
+        # Check all half-edges at once using the floating-point filter, and only check them exactly if it is uncertain
+        # The filter reads the corners of the triangle from the coordinates stored by the triangulation
+        i = triangle_exit_filter(self.triangulation.triangle_vertices, self.triangulation.coordinates, self.index,
+                                 float(p.x), float(p.y), float(q.x), float(q.y))
+        if i >= 0:
+            return self.half_edges[i]
+        elif i == -1:
+            return None
+
+        # Compute the orientations of p and q once per half-edge, and only test for an intersection if pq leaves it
         for he in self.half_edges:
-            if (he.intersects(p, q)
-                    and (he.orientation(p) == 2 != he.orientation(q)
-                         or (he.orientation(p) == 0 and he.orientation(q) == 1))):
-                return he
+            o_p = he.orientation(p)
+            o_q = he.orientation(q)
+            if o_p == 2 != o_q or (o_p == 0 and o_q == 1):
+                # The orientations of p and q are already known, so only the endpoints of the half-edge are left to test
+                # If no three points are collinear, pq crosses the half-edge if and only if it separates its endpoints
+                o_origin = orientation(p, q, he.origin)
+                o_target = orientation(p, q, he.target)
+                if o_q != 0 and o_p != 0 and o_origin != 0 and o_target != 0:
+                    if o_origin != o_target:
+                        return he
+                elif check_segment_segment_intersection(he.origin, he.target, p, q):
+                    return he
 
         return None
 
@@ -202,61 +416,196 @@ class DelaunayTriangulation:
         """
         :param points: a list of Point objects
         """
-        self.vertices = []
-        dt_input_points = []
+        self.vertices = list(points)
 
         # Initialize Delaunay points
-        for point in points:
+        for i, point in enumerate(self.vertices):
             point.outgoing_dt_edges = []
-            dt_input_points.append([float(point.x), float(point.y)])
-            self.vertices.append(point)
+            point.dt_index = i
 
         self.half_edges = []
         self.triangles = []
 
+        # Store the coordinates of the points, which are also the input of the Delaunay triangulation
+        self.coordinates = np.empty((len(self.vertices), 2))
+        self.update_coordinates()
+
         # Compute Delaunay triangulation
-        dt = Delaunay(np.array(dt_input_points))
+        # The cached triangles are copied, as they are updated when flipping half-edges
+        no_points = len(self.vertices)
+        simplices = compute_simplices(self.coordinates.tobytes(), no_points).copy()
+        no_half_edges = 3 * len(simplices)
+
+        # Half-edge 3i + j of triangle i is directed from point simplices[i][j] to point simplices[i][(j + 1) % 3]
+        origins = simplices.ravel()
+        targets = simplices[:, [1, 2, 0]].ravel()
+
+        # Find the twin of each half-edge by looking up the half-edge with reversed origin and target
+        keys = origins * no_points + targets
+        twin_keys = targets * no_points + origins
+        sorted_indices = np.argsort(keys)
+        twin_positions = np.minimum(np.searchsorted(keys[sorted_indices], twin_keys), no_half_edges - 1)
+        twins = sorted_indices[twin_positions]
+        twins[keys[twins] != twin_keys] = -1
+
+        # Construct the half-edges
+        self.half_edges = [HalfEdge(self.vertices[p1], self.vertices[p2])
+                           for p1, p2 in zip(origins.tolist(), targets.tolist())]
+
+        # Set the outgoing half-edges of each point in order of construction
+        # The half-edges are grouped by origin at once, using the number of outgoing half-edges of each point
+        outgoing = np.argsort(origins, kind='stable').tolist()
+        ends = np.cumsum(np.bincount(origins, minlength=no_points)).tolist()
+        start = 0
+        for point, end in zip(self.vertices, ends):
+            point.outgoing_dt_edges = [self.half_edges[k] for k in outgoing[start:end]]
+            start = end
+
+        # Construct the triangles
+        self.triangles = [Triangle(self, i, self.half_edges[3 * i:3 * i + 3]) for i in range(len(simplices))]
+
+        # Index the half-edges by the indices of their origin and target
+        self.half_edge_index = dict(zip(zip(origins.tolist(), targets.tolist()), self.half_edges))
+
+        # Set index, triangle, twin, next and prev of the half-edges
+        for k, twin in enumerate(twins.tolist()):
+            he = self.half_edges[k]
+            he.index = k
+            he.triangle = self.triangles[k // 3]
+            he.twin = self.half_edges[twin] if twin >= 0 else None
+            he.next = self.half_edges[k - k % 3 + (k + 1) % 3]
+            he.prev = self.half_edges[k - k % 3 + (k + 2) % 3]
+
+        # Store the triangles as point indices to quickly filter them on the Delaunay condition
+        # The point opposite to a half-edge is the origin of the previous half-edge of its twin
+        self.triangle_vertices = simplices
+        twin_prevs = twins - twins % 3 + (twins + 2) % 3
+        self.opposite_vertices = np.where(twins >= 0, origins[twin_prevs], -1).reshape(-1, 3)
+
+        # Store the connectivity of the half-edges and triangles as indices to walk through the triangulation quickly
+        # Flipping never changes which half-edges are twins, but it does change the half-edges of the two triangles
+        self.half_edge_twins = twins
+        self.half_edge_triangles = np.repeat(np.arange(len(simplices)), 3)
+        self.triangle_half_edges = np.arange(no_half_edges).reshape(-1, 3)
+
+        # A line segment crosses every half-edge at most once, so this buffer can hold all crossings of a walk
+        self.crossings = np.empty(no_half_edges, dtype=np.int64)
+
+    def update_coordinates(self):
+        """
+        Updates the stored coordinates of the points and the directions of the half-edges.
+        This is required after moving the points.
+        """
+        for i, point in enumerate(self.vertices):
+            self.coordinates[i, 0] = point.x
+            self.coordinates[i, 1] = point.y
 
-        # Iterate over all triangles
-        for i in range(len(dt.simplices)):
-            triangle = Triangle()
+        for he in self.half_edges:
+            he.update_direction()
 
-            # Consider each edge of the triangle
-            for j in range(3):
-                p1 = self.vertices[dt.simplices[i][j]]
-                p2 = self.vertices[dt.simplices[i][(j + 1) % 3]]
+    def update_triangle_vertices(self, triangle):
+        """
+        Updates the stored point and half-edge indices of the given triangle, and the points opposite to its half-edges.
 
-                # Construct half-edge
-                he = HalfEdge(p1, p2)
-                self.half_edges.append(he)
-                he.triangle = triangle
-                p1.outgoing_dt_edges.append(he)
+        :param triangle: a Triangle object
+        """
+        for j, he in enumerate(triangle.half_edges):
+            self.triangle_half_edges[triangle.index, j] = he.index
+            self.half_edge_triangles[he.index] = triangle.index
+            self.triangle_vertices[triangle.index, j] = he.origin.dt_index
+            self.opposite_vertices[triangle.index, j] = he.twin.next.target.dt_index if he.twin is not None else -1
 
-                # Find other triangle adjacent to the edge
-                neighbor_index = dt.neighbors[i][(j + 2) % 3]
+    def flip(self, he):
+        """
+        Flips the given half-edge and its twin, and updates the stored indices of the affected half-edges and triangles.
 
-                # If neighboring triangle was already created, find twin edge
-                if -1 < neighbor_index < i:
-                    twin = self.triangles[neighbor_index].get_edge(p2, p1)
+        :param he: a HalfEdge object
+        """
+        del self.half_edge_index[he.origin.dt_index, he.target.dt_index]
+        del self.half_edge_index[he.target.dt_index, he.origin.dt_index]
 
-                    # Set twin
-                    he.twin = twin
-                    twin.twin = he
+        he.flip()
 
-                triangle.half_edges.append(he)
+        self.half_edge_index[he.origin.dt_index, he.target.dt_index] = he
+        self.half_edge_index[he.target.dt_index, he.origin.dt_index] = he.twin
 
-            # Set next and prev
-            for j in range(3):
-                triangle.half_edges[j].next = triangle.half_edges[(j + 1) % 3]
-                triangle.half_edges[j].prev = triangle.half_edges[(j - 1) % 3]
+        # Only the two flipped triangles change, and the opposite points of their up to four neighboring triangles
+        self.update_triangle_vertices(he.triangle)
+        self.update_triangle_vertices(he.twin.triangle)
+        for e in [he.next, he.prev, he.twin.next, he.twin.prev]:
+            if e.twin is not None:
+                self.update_triangle_vertices(e.twin.triangle)
 
-            self.triangles.append(triangle)
+    def get_half_edge(self, origin, target):
+        """
+        Returns the half-edge of the Delaunay triangulation with given origin and target.
+
+        :param origin: a Point object
+        :param target: a Point object
+        :returns: the half-edge from origin to target, or None if it is not part of the Delaunay triangulation
+        """
+        return self.half_edge_index.get((origin.dt_index, target.dt_index))
+
+    def walk(self, triangle, p, q):
+        """
+        Walks from the given triangle along directed line segment pq, through all triangles that pq exits.
+        Assumes that the stored coordinates of the points are up to date.
+
+        :param triangle: the Triangle object to start from
+        :param p: a Point object
+        :param q: a Point object
+        :returns: the list of crossed half-edges and the last triangle, which pq does not exit
+        """
+        crossed_half_edges = []
+        px, py, qx, qy = float(p.x), float(p.y), float(q.x), float(q.y)
+
+        while True:
+            # Walk as far as possible using the floating-point filter
+            no_crossings, t, finished = walk_filter(self.triangle_vertices, self.triangle_half_edges,
+                                                    self.half_edge_twins, self.half_edge_triangles, self.coordinates,
+                                                    triangle.index, px, py, qx, qy, self.crossings)
+            crossed_half_edges.extend(self.half_edges[k] for k in self.crossings[:no_crossings].tolist())
+            triangle = self.triangles[t]
+
+            if finished:
+                return crossed_half_edges, triangle
+
+            # If the exit of the triangle is uncertain, determine it exactly and continue from the next triangle
+            crossed_he = triangle.exited_by(p, q)
+            if crossed_he is None:
+                return crossed_half_edges, triangle
+
+            crossed_half_edges.append(crossed_he)
+            triangle = crossed_he.twin.triangle
+
+    def find_non_delaunay(self, start=0):
+        """
+        Finds the first triangle from the given index onwards that does not satisfy the Delaunay condition.
+        Assumes that the stored coordinates of the points are up to date.
+
+        :param start: the index of the first triangle to check
+        :returns: the index of the triangle and its half-edge that should be flipped, or (None, None) if there is none
+        """
+        i = start
+        while True:
+            # Quickly find the next triangle that may not be Delaunay and verify it
+            i = find_non_delaunay_candidate(self.triangle_vertices, self.opposite_vertices, self.coordinates, i)
+            if i < 0:
+                return None, None
+
+            delaunay, he = self.triangles[i].is_delaunay()
+            if not delaunay:
+                return i, he
+
+            i += 1
 
     def is_valid(self):
         """
         Determines whether all triangles satisfy the Delaunay condition.
         """
-        return all(t.is_delaunay()[0] for t in self.triangles)
+        self.update_coordinates()
+
+        return self.find_non_delaunay()[0] is None
 
     def __str__(self):
         result = "Triangles:\n"
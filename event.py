@@ -2,6 +2,10 @@ class Event:
     """
     An event of the growing algorithm at time t.
     """
+    __slots__ = ('t', 'bundles', 'key')
+
+    priority = 0  # The tie-break between events at the same time, where events with a lower priority come first
+
     def __init__(self, t, bundles):
         """
         :param t: the time between 0 and 1
@@ -9,15 +13,20 @@ class Event:
         """
         self.t = t
         self.bundles = bundles
+        self.key = (t, self.priority)  # The key on which events are ordered in the event queue
 
     def __lt__(self, other):
-        return self.t < other.t or (self.t == other.t and type(self) == MergeEvent)
+        return self.key < other.key
 
 
 class SplitEvent(Event):
     """
     A split event stating that an elbow bundle splits a straight bundle at time t.
     """
+    __slots__ = ('sb', 'eb')
+
+    priority = 1  # Merge events are executed before split events at the same time
+
     def __init__(self, t, sb, eb):
         """
         :param t: the time between 0 and 1
@@ -34,6 +43,19 @@ class SplitEvent(Event):
         """
         return self.eb.splits(self.sb, self.t)
 
+    def execute(self, alg):
+        """
+        Splits the straight bundle sb by the elbow bundle eb and computes the next events of the affected bundles.
+
+        :param alg: a GrowingAlgorithm object
+        """
+        sb1, eb, sb2 = alg.crs.split(self.sb, self.eb, self.t)
+
+        alg.update_queue(self.eb, self.t)
+        alg.update_queue(sb1, self.t)
+        alg.update_queue(eb, self.t)
+        alg.update_queue(sb2, self.t)
+
     def __str__(self):
         return f"t = {self.t}: elbow bundle {self.eb} splits straight bundle {self.sb}"
 
@@ -42,6 +64,8 @@ class MergeEvent(Event):
     """
     A merge event stating that an elbow bundle is merged with its adjacent straight bundles at time t.
     """
+    __slots__ = ('eb',)
+
     def __init__(self, t, eb):
         """
         :param t: the time between 0 and 1
@@ -56,5 +80,15 @@ class MergeEvent(Event):
         """
         return self.eb.merges(self.t)
 
+    def execute(self, alg):
+        """
+        Merges the elbow bundle eb with its adjacent straight bundles and computes the next events of the new bundle.
+
+        :param alg: a GrowingAlgorithm object
+        """
+        sb = alg.crs.merge(self.eb.left, self.eb, self.eb.right)
+
+        alg.update_queue(sb, self.t)
+
     def __str__(self):
         return f"t = {self.t}: elbow bundle {self.eb} merges with straight bundles {self.eb.left} and {self.eb.right}"
@@ -1,14 +1,12 @@
-import itertools
-
 from point import Point
 
 
 class Vertex(Point):
-    id_iter = itertools.count()
+    __slots__ = ('id', 'color', 'radius', 'original_position', 'elbow_bundles')
 
     def __init__(self, x, y, color='black'):
         super().__init__(x, y)
-        self.id = next(self.id_iter)
+        self.id = None  # The index of the vertex in its graph, set when the graph is constructed
         self.color = color
         self.radius = 0.5
 
@@ -17,6 +15,8 @@ class Vertex(Point):
 
 
 class Edge:
+    __slots__ = ('v1', 'v2', 'path', 'weight', 'color', 'thickness', 'crossing_sequence', 'elbow_bundle_v1')
+
     def __init__(self, path, weight, color='black'):
         self.v1 = path[0]
         self.v2 = path[-1]
@@ -29,12 +29,7 @@ class Edge:
         self.elbow_bundle_v1 = None  # The terminal elbow bundle for v1
 
     def __str__(self):
-        result = f"({self.color}) ["
-        for point in self.path:
-            result += str(point) + ", "
-        result = result[:-2] + "]"
-
-        return result + f", weight = {self.weight}"
+        return f"({self.color}) [{', '.join(map(str, self.path))}], weight = {self.weight}"
 
 
 class Graph:
@@ -42,15 +37,13 @@ class Graph:
         self.vertices = vertices
         self.edges = edges
 
-    def __str__(self):
-        result = "Vertices: "
-        for vertex in self.vertices:
-            result += str(vertex) + ", "
-        result = result[:-2]
+        # Number the vertices by their index in the graph, such that the ids are contiguous within the graph
+        for i, vertex in enumerate(self.vertices):
+            vertex.id = i
 
-        result += "\nEdges:\n"
-        for edge in self.edges:
-            result += "- " + str(edge) + "\n"
-        result = result[:-1]
+    def __str__(self):
+        # Join the string representations at once, as repeated concatenation takes quadratic time
+        vertices = ", ".join(map(str, self.vertices))
+        edges = "\n".join(f"- {edge}" for edge in self.edges)
 
-        return result
+        return f"Vertices: {vertices}\nEdges:\n{edges}"
@@ -1,4 +1,4 @@
-from queue import PriorityQueue
+import heapq
 
 from compact_routing_structure import CompactRoutingStructure, ElbowBundle, StraightBundle
 from event import MergeEvent, SplitEvent
@@ -15,7 +15,7 @@ class GrowingAlgorithm:
         self.instance = instance
         self.dt = dt
         self.crs = CompactRoutingStructure(instance)
-        self.queue = PriorityQueue()
+        self.queue = []  # The event queue, as a binary heap ordered by event time
 
     def update_queue(self, b, t):
         """
@@ -24,7 +24,7 @@ class GrowingAlgorithm:
         :param b: a StraightBundle or ElbowBundle object
         :param t: the time between 0 and 1
         """
-        def binary_search(start_time, no_iter, func, *args):
+        def binary_search(start_time, no_iter, func, *args, upper_bound=None):
             """
             Performs a binary search to approximate the actual event time.
             The value of func(args, start_time) must be True, while func(args, start_time - dt) must be False.
@@ -33,20 +33,28 @@ class GrowingAlgorithm:
             :param no_iter: the number of iterations
             :param func: a function call to an event condition
             :param args: the arguments of func, except for the time parameter
-            :returns: the approximated event time
+            :param upper_bound: if given, the search stops early once the event time must exceed this bound
+            :returns: the approximated event time, which exceeds upper_bound if the search stopped early
             """
             # We start with the interval [t1, t2] = [start_time - dt, start_time]
             # In each iteration, check if the event is still valid at time t' = (t2 + t1) / 2
             # If it is, decrease the interval to [t1, t'], otherwise to [t', t2]
+            # Halving the step is exact in floating-point arithmetic, so each step equals dt / 2^(i + 1)
             new_t = start_time
+            step = self.dt
             for i in range(no_iter):
-                step = self.dt / (2 ** (i + 1))
+                step /= 2
                 new_t -= step
 
                 # If the event is not valid at the new time, go back to the previous time
                 if not func(*args, new_t):
                     new_t += step
 
+                # The remaining steps sum to less than step, so the approximation cannot decrease below new_t - step
+                # We use twice the step as margin for floating-point rounding errors in new_t
+                if upper_bound is not None and new_t - 2 * step > upper_bound:
+                    break
+
             return new_t
 
         def compute_next_split_event():
@@ -54,10 +62,7 @@ class GrowingAlgorithm:
             Computes the next split event of the given bundle after time t.
             """
             # Determine which bundles to consider for the split
-            if type(b) == StraightBundle:
-                split_bundles = self.crs.elbow_bundles
-            else:
-                split_bundles = self.crs.straight_bundles
+            split_bundles = b.split_candidates(self.crs)
 
             # Grow time by dt until the next split event of b is found
             # Since we roughly approximate the time, there may be multiple bundles that split with b at the found time
@@ -68,7 +73,13 @@ class GrowingAlgorithm:
                 if b.is_connected_to(bundle):
                     continue
 
+                # Skip the times before the lower bound on the split time, at which b cannot split with the bundle
+                # The time is still increased in steps of dt, such that the same times are evaluated as without it
+                min_split_time = b.get_min_split_time(bundle)
                 current_t = t + self.dt
+                while current_t <= next_split_time and current_t < min_split_time:
+                    current_t += self.dt
+
                 while current_t <= next_split_time:
                     if b.splits(bundle, current_t):
                         if current_t < next_split_time:
@@ -89,7 +100,8 @@ class GrowingAlgorithm:
             first_t = next_split_time
             for bundle in next_split_bundles:
                 # Use binary search to approximate the exact split time
-                new_t = binary_search(next_split_time, 30, b.splits, bundle)
+                # Stop early if the split time of the bundle cannot be at most the current first split time
+                new_t = binary_search(next_split_time, 30, b.splits, bundle, upper_bound=first_t)
 
                 if new_t <= first_t:
                     first_t = new_t
@@ -126,13 +138,13 @@ class GrowingAlgorithm:
         # Compute the next split event of b and insert it into the queue
         split_event = compute_next_split_event()
         if split_event is not None:
-            self.queue.put(split_event)
+            heapq.heappush(self.queue, split_event)
 
         if type(b) == ElbowBundle and not b.is_terminal:
             # Compute the next merge event of b and insert it into the queue
             merge_event = compute_next_merge_event()
             if merge_event is not None:
-                self.queue.put(merge_event)
+                heapq.heappush(self.queue, merge_event)
 
     def compute_thick_edges(self, print_events=False):
         """
@@ -146,13 +158,13 @@ class GrowingAlgorithm:
             self.update_queue(eb, 0)
 
         if print_events:
-            if self.queue.empty():
+            if not self.queue:
                 print("No growing events")
             else:
                 print("Growing events:")
 
-        while not self.queue.empty():
-            event = self.queue.get()
+        while self.queue:
+            event = heapq.heappop(self.queue)
 
             # Handle invalid events
             if any(b not in self.crs for b in event.bundles) or not event.is_valid():
@@ -167,18 +179,8 @@ class GrowingAlgorithm:
             if print_events:
                 print(f"   {event}")
 
-            # Execute the event
-            if type(event) == SplitEvent:
-                sb1, eb, sb2 = self.crs.split(event.sb, event.eb, event.t)
-
-                self.update_queue(event.eb, event.t)
-                self.update_queue(sb1, event.t)
-                self.update_queue(eb, event.t)
-                self.update_queue(sb2, event.t)
-            else:
-                sb = self.crs.merge(event.eb.left, event.eb, event.eb.right)
-
-                self.update_queue(sb, event.t)
+            # Execute the event and compute the next events of the affected bundles
+            event.execute(self)
 
         # Unzip the bundles to obtain the singular thick edges
         self.crs.unzip()
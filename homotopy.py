@@ -1,8 +1,10 @@
 from collections import deque
+from itertools import chain, islice
+import numpy as np
 
 from delaunay_triangulation import DelaunayTriangulation
 from point import Point
-from utils import on_segment, orientation
+from utils import in_bounding_box, orientation, orientation_filters
 
 
 class CrossingSequence:
@@ -10,6 +12,8 @@ class CrossingSequence:
     The (reduced or unreduced) sequence of half-edges of the Delaunay triangulation crossed by the edge.
     Only includes the (inner) half-edges that are crossed when exiting their corresponding triangle.
     """
+    __slots__ = ('edge', 'sequence')
+
     def __init__(self, edge):
         """
         :param edge: an Edge object
@@ -28,13 +32,36 @@ class CrossingSequence:
         """
         i = 0
 
+        # A triangle adjacent to v1 contains an edge link if the link is left of both its half-edges incident on v1
+        # We collect the floating-point coordinates of the half-edges leaving v1, followed by those entering v1
+        outgoing = self.edge.v1.outgoing_dt_edges
+        incoming = [he.prev for he in outgoing]
+        half_edges = outgoing + incoming
+        pxs = np.array([float(he.origin.x) for he in half_edges])
+        pys = np.array([float(he.origin.y) for he in half_edges])
+        qxs = np.array([float(he.target.x) for he in half_edges])
+        qys = np.array([float(he.target.y) for he in half_edges])
+
         # Find the first edge link that moves through a triangle adjacent to v1
-        while i < len(self.edge.path) - 1:
-            target = self.edge.path[i + 1]
+        path = self.edge.path
+        while i < len(path) - 1:
+            target = path[i + 1]
+
+            # Determine the orientations of the target wrt all half-edges at once, using the floating-point filter
+            orientations = orientation_filters(pxs, pys, qxs, qys, float(target.x), float(target.y))
 
             # For each triangle adjacent to v1, check if it contains the edge link
-            for he in self.edge.v1.outgoing_dt_edges:
-                if he.orientation(target) == he.prev.orientation(target) == 2:
+            # Uncertain orientations are computed exactly
+            for k, he in enumerate(outgoing):
+                o1 = orientations[k]
+                if o1 == -1:
+                    o1 = he.orientation(target)
+
+                o2 = orientations[len(outgoing) + k]
+                if o2 == -1:
+                    o2 = incoming[k].orientation(target)
+
+                if o1 == o2 == 2:
                     return he.triangle, i
 
             i += 1
@@ -43,153 +70,172 @@ class CrossingSequence:
 
     def compute_sequence(self):
         """
-        Computes the unreduced crossing sequence of the edge.
+        Computes the crossing sequence of the edge, in which no crossing is directly followed by its twin.
         """
         # Compute initial triangle and index of first edge link moving 'through' the triangle
         current_triangle, i = self.compute_initial_triangle()
 
-        # Iterate over the edge links and record crossings
-        while i < len(self.edge.path) - 1:
-            p1 = self.edge.path[i]
-            p2 = self.edge.path[i + 1]
-
-            # Compute which half-edge of the current triangle is crossed by the edge link
-            crossed_he = current_triangle.exited_by(p1, p2)
-
-            # If no edge was crossed, consider the next edge link
-            # Otherwise, repeat the following until the edge link does not cross the current triangle:
-            #   (1) add the crossed edge to the crossing sequence
-            #   (2) update the current triangle
-            #   (3) compute which half-edge of the current triangle is crossed by the edge link
-            while crossed_he is not None:
-                self.sequence.append(crossed_he)
-                current_triangle = crossed_he.twin.triangle
-                crossed_he = current_triangle.exited_by(p1, p2)
+        # Iterate over the edge links starting from the first one and record crossings
+        path = self.edge.path
+        if i >= len(path) - 1:
+            return
 
-            i += 1
+        # Adjacent pairs of equivalent crossings are cancelled on the fly, using the sequence so far as a stack
+        # This way, the unreduced sequence is never materialized, while reduce still yields the same result
+        sequence = self.sequence
+        triangulation = current_triangle.triangulation
+        for p1, p2 in zip(path[i:-1], path[i + 1:]):
+            # Walk through the triangles exited by the edge link, starting from the current triangle
+            # Add the crossed half-edges to the crossing sequence and continue from the triangle where the walk ended
+            crossed_half_edges, current_triangle = triangulation.walk(current_triangle, p1, p2)
+            for crossing in crossed_half_edges:
+                if sequence and sequence[-1] is crossing.twin:
+                    sequence.pop()
+                else:
+                    sequence.append(crossing)
 
     def reduce(self):
         """
         Reduces the crossing sequence to its minimum homotopic equivalent.
         """
-        # Iteratively remove adjacent pairs of equivalent crossings
-        i = 0
-        while i < len(self.sequence) - 1:
-            if self.sequence[i] == self.sequence[i + 1].twin:
-                del self.sequence[i:i+2]
-
-                i = max(0, i - 1)
+        # Remove adjacent pairs of equivalent crossings in a single pass, using the reduced prefix as a stack
+        # If a crossing undoes the last crossing of the reduced prefix, both are removed
+        reduced_sequence = []
+        for crossing in self.sequence:
+            if reduced_sequence and reduced_sequence[-1] is crossing.twin:
+                reduced_sequence.pop()
             else:
-                i += 1
+                reduced_sequence.append(crossing)
 
         # Remove redundant edge links incident on vertices
-        while self.sequence:
-            if any(e in self.edge.v1.outgoing_dt_edges for e in [self.sequence[0], self.sequence[0].twin]):
-                del self.sequence[0]
-            elif any(e in self.edge.v2.outgoing_dt_edges for e in [self.sequence[-1], self.sequence[-1].twin]):
-                del self.sequence[-1]
+        # A half-edge is outgoing from a point if and only if the point is its origin
+        v1 = self.edge.v1
+        v2 = self.edge.v2
+        start = 0
+        end = len(reduced_sequence)
+        while start < end:
+            first = reduced_sequence[start]
+            last = reduced_sequence[end - 1]
+            if first.origin is v1 or (first.twin is not None and first.twin.origin is v1):
+                start += 1
+            elif last.origin is v2 or (last.twin is not None and last.twin.origin is v2):
+                end -= 1
             else:
                 break
 
+        self.sequence = reduced_sequence[start:end]
+
     def update(self, he):
         """
         Updates the reduced crossing sequence after flipping half-edge he.
 
         :param he: a HalfEdge object
         """
+        # Look up the half-edges of the quadrilateral around he once, as they are compared against every crossing
+        # Half-edges are unique objects, so we compare them by identity
+        he_twin = he.twin
+        he_next, he_prev = he.next, he.prev
+        he_twin_next, he_twin_prev = he_twin.next, he_twin.prev
+        he_next_twin, he_prev_twin = he_next.twin, he_prev.twin
+        he_twin_next_twin, he_twin_prev_twin = he_twin_next.twin, he_twin_prev.twin
+
+        # Map each crossing via which the edge enters the quadrilateral around he to its separating half-edge
+        # The entries for he are added last, such that he takes precedence over its twin
+        separating_half_edges = {id(he_twin_next_twin): he_twin, id(he_twin_prev_twin): he_twin,
+                                 id(he_next_twin): he, id(he_prev_twin): he}
+
         def check_quadrilateral():
             """
             Checks whether the edge enters a quadrilateral for which he is the separating edge via the current crossing.
-            Updates the crossing sequence of the edge accordingly.
+            Updates the remaining crossings of the edge accordingly.
             """
             # Check if he or its twin is the separating half-edge of the quadrilateral entered via the current crossing
             # The separating half-edge is the half-edge that the edge may cross, taking into account the half-edge side
-            separating_half_edge = None
-            if crossing == he.next.twin or crossing == he.prev.twin:
-                separating_half_edge = he
-            elif crossing == he.twin.next.twin or crossing == he.twin.prev.twin:
-                separating_half_edge = he.twin
+            separating_half_edge = separating_half_edges.get(id(crossing))
 
             if separating_half_edge is not None:
                 # Get the next two crossings of the edge
-                crossing2 = self.sequence[i + 1]
-                crossing3 = self.sequence[i + 2] if i < len(self.sequence) - 2 else None
+                crossing2 = remaining[1]
+                crossing3 = remaining[2] if len(remaining) > 2 else None
 
                 # If the edge crossed the separating half-edge, check if it still does after the flip
-                if crossing2 == he or crossing2 == he.twin:
+                if crossing2 is he or crossing2 is he_twin:
                     # First delete the crossed half-edge and then replace it by the separating half-edge if necessary
                     # We do this because the separating half-edge may be the twin of crossing2
-                    del self.sequence[i + 1]
+                    del remaining[1]
 
                     # If crossing2 is the last crossing, remove it as it has become connected to v2 after the flip
                     # If the third crossing is in the same triangle as the separating half-edge, also remove it
                     # Otherwise, (re)insert the separating half-edge
-                    if crossing3 is not None and crossing3.triangle != separating_half_edge.triangle:
-                        self.sequence.insert(i + 1, separating_half_edge)
+                    if crossing3 is not None and crossing3.triangle is not separating_half_edge.triangle:
+                        remaining.insert(1, separating_half_edge)
 
                 # Otherwise, the edge crosses the separating half-edge after the flip
                 else:
-                    self.sequence.insert(i + 1, separating_half_edge)
+                    remaining.insert(1, separating_half_edge)
+
+        # The flip only affects crossings of the half-edges of the quadrilateral around he, including their twins
+        # If the crossing sequence contains none of them, it is unaffected and remains reduced
+        quadrilateral = [he, he_next, he_prev, he_twin, he_twin_next, he_twin_prev]
+        quadrilateral_ids = {id(e) for e in quadrilateral} | {id(e.twin) for e in quadrilateral if e.twin is not None}
+        if not any(id(crossing) in quadrilateral_ids for crossing in self.sequence):
+            return
 
         # Iterate over the crossings of the crossing sequence and update them due to flipping he
-        i = 0
-        while i < len(self.sequence):
-            crossing = self.sequence[i]
+        # We build the updated sequence in a single pass, without inserting or deleting in the middle of a list
+        # The updated crossings are appended to a new list, while the crossings still to be handled are kept in a deque
+        # All changes then happen at the front of the deque, right after the current crossing
+        updated = []
+        remaining = deque(self.sequence)
+        while remaining:
+            crossing = remaining[0]
 
             # Handle the case where it is the first crossing after leaving vertex v1
-            if i == 0:
+            if not updated:
                 # If he is the first crossing, remove it as he has become connected to v1 after the flip
-                if crossing == he or crossing == he.twin:
-                    del self.sequence[i]
+                if crossing is he or crossing is he_twin:
+                    remaining.popleft()
 
                 # If he was one of v1's incident half-edges before the flip, its twin has become the first crossing
-                elif crossing == he.next or crossing == he.prev:
-                    self.sequence.insert(i, he.twin)
-                    i += 1
-                elif crossing == he.twin.next or crossing == he.twin.prev:
-                    self.sequence.insert(i, he)
-                    i += 1
+                # The current crossing is then handled again as the next crossing
+                elif crossing is he_next or crossing is he_prev:
+                    updated.append(he_twin)
+                elif crossing is he_twin_next or crossing is he_twin_prev:
+                    updated.append(he)
 
                 # Otherwise, check the quadrilateral that the edge enters via the crossing
                 else:
                     check_quadrilateral()
-                    i += 1
+                    updated.append(remaining.popleft())
 
             # Handle the case where it is the last crossing before arriving at vertex v2
-            elif i == len(self.sequence) - 1:
+            elif len(remaining) == 1:
+                remaining.popleft()
+
                 # If he is the last crossing, remove it as he has become connected to v2 after the flip
-                if crossing == he or crossing == he.twin:
-                    del self.sequence[i]
+                if crossing is he or crossing is he_twin:
+                    continue
+
+                updated.append(crossing)
 
                 # If he was one of v2's incident half-edges before the flip, it has become the last crossing
-                elif crossing == he.next.twin or crossing == he.prev.twin:
-                    self.sequence.insert(i + 1, he)
-                    i += 2
-                elif crossing == he.twin.next.twin or crossing == he.twin.prev.twin:
-                    self.sequence.insert(i + 1, he.twin)
-                    i += 2
-                else:
-                    i += 1
+                if crossing is he_next_twin or crossing is he_prev_twin:
+                    updated.append(he)
+                elif crossing is he_twin_next_twin or crossing is he_twin_prev_twin:
+                    updated.append(he_twin)
 
             # Handle the general case where it is a crossing via which the edge enters a quadrilateral
             else:
                 check_quadrilateral()
-                i += 1
+                updated.append(remaining.popleft())
+
+        self.sequence = updated
 
         # Reduce the crossing sequence to remove unnecessary crossings
         self.reduce()
 
     def __str__(self):
-        i = 1
-        result = ""
-        for he in self.sequence:
-            result += f"{i}. {he}\n"
-            i += 1
-
-        if len(self.sequence) > 0:
-            result = result[:-1]
-
-        return result
+        return "\n".join(f"{i}. {he}" for i, he in enumerate(self.sequence, 1))
 
 
 class Funnel:
@@ -197,6 +243,8 @@ class Funnel:
     A funnel describing the possible space containing the shortest homotopic path of an edge.
     The funnel consists of a tail (polygonal path) from source to a point called the apex, and a fan (simple polygon).
     """
+    __slots__ = ('edge', 'tail', 'apex', 'apex_index', 'fan')
+
     def __init__(self, edge):
         """
         :param edge: an Edge object
@@ -206,6 +254,7 @@ class Funnel:
         # Initialize funnel with v1
         self.tail = None
         self.apex = None
+        self.apex_index = None  # The index of the apex in the fan, maintained as the fan changes
         self.fan = None
 
         self.compute_funnel()
@@ -227,9 +276,13 @@ class Funnel:
             new_leftmost_point = self.fan[0]
 
             # If removed point was the apex, set new apex
+            # Otherwise, the apex moved one position to the left in the fan
             if old_leftmost_point is self.apex:
                 self.apex = new_leftmost_point
+                self.apex_index = 0
                 self.tail.append(self.apex)
+            else:
+                self.apex_index -= 1
 
             # If leftmost point is the apex, the leftmost wedge is on the right concave chain of the fan
             if new_leftmost_point is self.apex:
@@ -247,6 +300,7 @@ class Funnel:
 
         # Extend fan to the left
         self.fan.appendleft(point)
+        self.apex_index += 1
 
     def contract_right(self, point):
         """
@@ -267,6 +321,7 @@ class Funnel:
             # If removed point was the apex, set new apex
             if old_rightmost_point is self.apex:
                 self.apex = new_rightmost_point
+                self.apex_index = len(self.fan) - 1
                 self.tail.append(self.apex)
 
             # If rightmost point is the apex, the rightmost wedge is on the left concave chain of the fan
@@ -291,14 +346,19 @@ class Funnel:
         Advances the tail of the funnel until the concave chains of the fan only intersect in the apex.
         """
         # Since the chains of the fan are concave, we can check for chain overlap starting from the apex
-        apex_index = self.fan.index(self.apex)
         while self.fan[0] is not self.apex and self.fan[-1] is not self.apex:
+            apex_index = self.apex_index
+
             # Get the next point of the left chain and the next point of the right chain
             p1 = self.fan[apex_index - 1]
             p2 = self.fan[apex_index + 1]
 
+            # The chains can only overlap if the apex, p1 and p2 are collinear, which we check once for both cases
+            if orientation(self.apex, p1, p2) != 0:
+                break
+
             # If p2 lies on the line segment between the apex and p1, we advance the tail to p2
-            if on_segment(self.apex, p1, p2):
+            if in_bounding_box(self.apex, p1, p2):
                 self.apex = p2
                 self.tail.append(p2)
 
@@ -306,7 +366,7 @@ class Funnel:
                 del self.fan[apex_index]
 
             # If p1 lies on the line segment between the apex and p2, we advance the tail to p1
-            elif on_segment(self.apex, p2, p1):
+            elif in_bounding_box(self.apex, p2, p1):
                 self.apex = p1
                 self.tail.append(p1)
 
@@ -314,7 +374,7 @@ class Funnel:
                 del self.fan[apex_index]
 
                 # Since the new apex p1 was located one before the previous apex in the fan, decrease apex index by one
-                apex_index -= 1
+                self.apex_index -= 1
 
             # Otherwise, the current concave chains of the fan only intersect in the apex by definition, so we are done
             else:
@@ -331,29 +391,27 @@ class Funnel:
         if len(sequence) == 0:
             self.tail = [self.edge.v1, self.edge.v2]
             self.apex = self.edge.v2
+            self.apex_index = 0
             self.fan = deque([self.edge.v2])
             return
 
-        # Add extra half-edge incident on v2 as 'crossing' to sequence to add v2 to the fan at the end
+        # Consider an extra half-edge incident on v2 as final 'crossing' after the sequence to add v2 to the fan
+        # This is the half-edge from v2 to the target of the last crossing, which we look up in the DT
+        # The final crossing is not added to the sequence itself, which thus remains unchanged
         last_crossing = sequence[-1]
-        for he in self.edge.v2.outgoing_dt_edges:
-            if he.target is last_crossing.target:
-                sequence.append(he)
-                break
+        final_crossing = last_crossing.triangle.triangulation.get_half_edge(self.edge.v2, last_crossing.target)
+        crossings = chain(sequence, [final_crossing] if final_crossing is not None else [])
 
         # Initialize funnel with v1
         self.tail = [self.edge.v1]
         self.apex = self.edge.v1
+        self.apex_index = 0
         self.fan = deque([self.edge.v1])
 
         current_crossing = None
 
         # Consider each crossing in turn
-        i = 0
-        while i < len(sequence):
-            # Consider the next crossing
-            next_crossing = sequence[i]
-
+        for next_crossing in crossings:
             # If fan consists of only one point, it is the apex
             # This happens when the funnel is not yet initialized, or the edge left the fan via the previous crossing
             # We then rebuild the fan starting from the first crossing not incident on the apex
@@ -362,6 +420,7 @@ class Funnel:
                 if next_crossing.origin is not self.apex and next_crossing.target is not self.apex:
                     self.fan.appendleft(next_crossing.target)
                     self.fan.append(next_crossing.origin)
+                    self.apex_index = 1
 
             # Otherwise, the next crossing differs in exactly one point from the current crossing
             # We then contract the funnel accordingly from the left or right
@@ -384,22 +443,19 @@ class Funnel:
             self.advance_tail()
 
             current_crossing = next_crossing
-            i += 1
 
         # If fan consists of only one point, it does not contain v2 as v2 cannot be the apex
         # This is because the last contraction of the funnel was with respect to v2
         # Therefore, we can set v2 as the apex and add it to the funnel
         if len(self.fan) == 1:
             self.apex = self.edge.v2
+            self.apex_index = 0
             self.tail.append(self.edge.v2)
 
             # Update the fan
             del self.fan[-1]
             self.fan.append(self.edge.v2)
 
-        # Remove the added crossing incident on v2 from the sequence
-        del sequence[-1]
-
     def compute_shortest_path(self):
         """
         Computes the shortest path through the funnel, including all collinear (straight) bends.
@@ -409,56 +465,33 @@ class Funnel:
         # Initialize the shortest path as the tail of the funnel
         shortest_path = self.tail
 
-        found_apex = False
-
         # If v2 is the leftmost point of the fan, the shortest path consists of the tail plus the left concave chain
+        # These are the points before the apex in the fan, which we add from the apex towards v2
         if self.fan[0] is self.edge.v2:
-            while self.fan:
-                point = self.fan.pop()
-
-                if found_apex:
-                    shortest_path.append(point)
-                elif point is self.apex:
-                    found_apex = True
+            shortest_path.extend(islice(reversed(self.fan), len(self.fan) - self.apex_index, None))
 
         # Otherwise, the shortest path consists of the tail plus the right concave chain
+        # These are the points after the apex in the fan
         else:
-            while self.fan:
-                point = self.fan.popleft()
-
-                if found_apex:
-                    shortest_path.append(point)
-                elif point is self.apex:
-                    found_apex = True
+            shortest_path.extend(islice(self.fan, self.apex_index + 1, None))
 
         return shortest_path
 
     def __str__(self):
-        result = "Tail: "
-        for point in self.tail:
-            result += str(point) + " -> "
+        tail = " -> ".join(map(str, self.tail))
 
-        if len(self.tail) > 0:
-            result = result[:-4]
-        else:
-            result = result[:-1]
-
-        result += "\nFan: "
+        # The points of the fan are separated by arrows pointing towards the apex
+        fan = []
         found_apex = False
         for point in self.fan:
-            result += str(point)
+            if fan:
+                fan.append(" <- " if not found_apex else " -> ")
+            fan.append(str(point))
 
             if point is self.apex:
                 found_apex = True
 
-            result += " <- " if not found_apex else " -> "
-
-        if len(self.fan) > 0:
-            result = result[:-4]
-        else:
-            result = result[:-1]
-
-        return result
+        return f"Tail: {tail}\nFan: {''.join(fan)}"
 
 
 class Homotopy:
@@ -510,6 +543,11 @@ class Homotopy:
                 # Assign the reduced crossing sequence to the edge
                 edge.crossing_sequence = sequence
 
+            # If the reduced crossing sequence is empty, the shortest path is a straight-line edge
+            if not edge.crossing_sequence.sequence:
+                edge.path = [edge.v1, edge.v2]
+                continue
+
             # Compute the funnel of the reduced crossing sequence
             funnel = Funnel(edge)
 
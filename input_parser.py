@@ -1,3 +1,4 @@
+import itertools
 import math
 import os
 import xml.etree.ElementTree as ET
@@ -51,8 +52,8 @@ def read_ipe_instance(instance):
     - 'obstacles': containing point obstacles (marks [M] or circles [O]) and/or polygonal obstacles (polylines [P])
     :returns: a Graph object, a list of Obstacle objects and the x- and y-ranges of the instance
     """
-    # Initialize Vertex and Obstacle id counters
-    Vertex.id_iter = itertools.count()
+    # Initialize Obstacle id counter
+    # Vertex ids are assigned by the Graph
     Obstacle.id_iter = itertools.count()
 
     vertices = []
@@ -28,9 +28,4 @@ class PolygonalObstacle(Obstacle):
         self.path = path
 
     def __str__(self):
-        result = "["
-        for point in self.path:
-            result += str(point) + ", "
-        result = result[:-2] + "]"
-
-        return result
+        return f"[{', '.join(map(str, self.path))}]"
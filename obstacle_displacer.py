@@ -1,7 +1,10 @@
 from enum import Enum
+import numpy as np
 
 from utils import distance
 
+conflict_filter_error = 1e-9  # The relative error bound of the conflict values computed in floating-point arithmetic
+
 
 class Objective(Enum):
     """
@@ -53,8 +56,26 @@ class ObstacleDisplacer:
         """
         Determines whether the current configuration of obstacles satisfies all constraints.
         """
-        for constraint in self.constraints:
-            if constraint.value > 0:
+        if not self.constraints:
+            return True
+
+        # Compute the conflict values of all constraints at once in floating-point arithmetic
+        p1_xs = np.array([float(c.p1.x) for c in self.constraints])
+        p1_ys = np.array([float(c.p1.y) for c in self.constraints])
+        p2_xs = np.array([float(c.p2.x) for c in self.constraints])
+        p2_ys = np.array([float(c.p2.y) for c in self.constraints])
+        min_seps = np.array([float(c.min_separation) for c in self.constraints])
+        distances = np.hypot(p2_xs - p1_xs, p2_ys - p1_ys)
+        values = min_seps - distances
+        errors = conflict_filter_error * (np.abs(min_seps) + distances + 1)
+
+        # A constraint is certainly violated if its value exceeds the error bound
+        if np.any(values > errors):
+            return False
+
+        # Fall back to the exact conflict value for the constraints whose values are within the error bound
+        for i in np.flatnonzero(np.abs(values) <= errors):
+            if self.constraints[i].value > 0:
                 return False
 
         return True
@@ -110,15 +131,28 @@ class ObstacleDisplacer:
             # This works as expected if the DT is still a valid triangulation after displacing the obstacles
             # The orthogonality constraints of the linear program often make sure that this is the case
             # Especially Delaunay edges 'moving over' points may lead to unexpected behavior
-            while not self.instance.homotopy.dt.is_valid():
-                for t in self.instance.homotopy.dt.triangles:
-                    delaunay, he = t.is_delaunay()
-                    if not delaunay:
-                        he.flip()
-
-                        # Update the crossing sequences
-                        for edge in self.instance.graph.edges:
-                            edge.crossing_sequence.update(he)
+            # We repeatedly pass over the triangles until a full pass does not encounter any non-Delaunay triangle
+            dt = self.instance.homotopy.dt
+            dt.update_coordinates()
+            start = 0
+            while True:
+                i, he = dt.find_non_delaunay(start)
+
+                if i is None:
+                    # If the pass started from the first triangle, all triangles are Delaunay
+                    if start == 0:
+                        break
+
+                    start = 0
+                    continue
+
+                dt.flip(he)
+
+                # Update the crossing sequences
+                for edge in self.instance.graph.edges:
+                    edge.crossing_sequence.update(he)
+
+                start = i + 1
 
             # Recompute constraints
             self.compute_constraints(keep_prev_constraints)
@@ -1,9 +1,12 @@
 class Point:
+    __slots__ = ('x', 'y', 'outgoing_dt_edges', 'dt_index')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
 
         self.outgoing_dt_edges = []  # Set of half-edges leaving the point in a Delaunay triangulation
+        self.dt_index = None  # The index of the point in a Delaunay triangulation
 
     def __eq__(self, other):
         return self.x == other.x and self.y == other.y
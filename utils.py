@@ -1,8 +1,13 @@
 import math
 from fractions import Fraction
+import numpy as np
+
+from numba import njit
 
 from point import Point
 
+float_epsilon = 2 ** -53  # The relative rounding error of a floating-point operation
+
 
 def transform_point(p, t):
     """
@@ -22,6 +27,21 @@ def distance(p, q):
     return math.sqrt((p.x - q.x) ** 2 + (p.y - q.y) ** 2)
 
 
+def segment_point_distance(p, q, r):
+    """
+    Determines the distance between line segment pq and point r in floating-point arithmetic.
+    """
+    px, py = float(p.x), float(p.y)
+    dx, dy = float(q.x) - px, float(q.y) - py
+    rx, ry = float(r.x) - px, float(r.y) - py
+
+    # Project r onto the line through p and q, and clamp the projection to the segment
+    length_squared = dx * dx + dy * dy
+    s = 0 if length_squared == 0 else min(max((rx * dx + ry * dy) / length_squared, 0), 1)
+
+    return math.hypot(rx - s * dx, ry - s * dy)
+
+
 def angle(p, q):
     """
     Determines the angle of rotation of line segment pq in radians.
@@ -93,6 +113,53 @@ def vector_bisector(p, q):
     return bisector
 
 
+@njit(cache=True)
+def orientation_filter(px, py, qx, qy, rx, ry):
+    """
+    Determines the orientation of the ordered point triplet (p, q, r) using floating-point arithmetic.
+    Only returns the orientation if it is certain, i.e., if the sign of the determinant exceeds its error bound.
+    The error bound also accounts for the rounding of exact (e.g., Fraction) coordinates to floating-point numbers.
+
+    :returns: 1 : clockwise, 2 : counterclockwise, -1 : uncertain (e.g., collinear)
+    """
+    d1 = qy - py
+    d2 = rx - qx
+    d3 = qx - px
+    d4 = ry - qy
+    val = d1 * d2 - d3 * d4
+
+    # Bound the error of the differences, caused by rounding the coordinates and the subtractions
+    magnitude = max(abs(px), abs(py), abs(qx), abs(qy), abs(rx), abs(ry))
+    diff_error = 2 * float_epsilon * magnitude
+
+    # Bound the error of the determinant, and double it to be safe
+    error = (4 * float_epsilon * (abs(d1 * d2) + abs(d3 * d4))
+             + diff_error * (abs(d1) + abs(d2) + abs(d3) + abs(d4))
+             + 2 * diff_error * diff_error)
+    error *= 2
+
+    # Decide the orientation with a single comparison, and derive clockwise or counterclockwise from the sign
+    if abs(val) > error:
+        return 1 + (val < 0)
+
+    return -1
+
+
+@njit(cache=True)
+def orientation_filters(pxs, pys, qxs, qys, rx, ry):
+    """
+    Determines the orientations of the ordered point triplets (p_i, q_i, r) using floating-point arithmetic.
+    Applies orientation_filter to each pair of points p_i and q_i with the same point r at once.
+
+    :returns: an array of orientations, with 1 : clockwise, 2 : counterclockwise, -1 : uncertain (e.g., collinear)
+    """
+    orientations = np.empty(len(pxs), np.int64)
+    for i in range(len(pxs)):
+        orientations[i] = orientation_filter(pxs[i], pys[i], qxs[i], qys[i], rx, ry)
+
+    return orientations
+
+
 def orientation(p, q, r):
     """
     Determines the orientation of the ordered point triplet (p, q, r).
@@ -100,6 +167,11 @@ def orientation(p, q, r):
 
     :returns: 0 : collinear, 1 : clockwise, 2 : counterclockwise
     """
+    # Use the floating-point filter and only compute the orientation exactly if it is uncertain
+    o = orientation_filter(float(p.x), float(p.y), float(q.x), float(q.y), float(r.x), float(r.y))
+    if o != -1:
+        return o
+
     val = (q.y - p.y) * (r.x - q.x) - (q.x - p.x) * (r.y - q.y)
 
     if val > 0:
@@ -113,11 +185,18 @@ def orientation(p, q, r):
         return 0
 
 
+def in_bounding_box(p, q, r):
+    """
+    Determines whether point r lies in the axis-aligned bounding box of points p and q.
+    """
+    return min(p.x, q.x) <= r.x <= max(p.x, q.x) and min(p.y, q.y) <= r.y <= max(p.y, q.y)
+
+
 def on_segment(p, q, r):
     """
     Determines whether point r lies on line segment pq.
     """
-    if orientation(p, q, r) == 0 and min(p.x, q.x) <= r.x <= max(p.x, q.x) and min(p.y, q.y) <= r.y <= max(p.y, q.y):
+    if orientation(p, q, r) == 0 and in_bounding_box(p, q, r):
         return True
 
     return False
@@ -169,11 +248,36 @@ def in_circle(p, c, r):
     return distance(p, c) < r
 
 
+@njit(cache=True)
+def segment_segment_intersection_filter(p1x, p1y, q1x, q1y, p2x, p2y, q2x, q2y):
+    """
+    Determines whether line segments p1q1 and p2q2 intersect using the floating-point orientation filter.
+    Only handles the general case, which applies if all four orientations are certain.
+
+    :returns: 1 : intersect, 0 : do not intersect, -1 : uncertain
+    """
+    o1 = orientation_filter(p1x, p1y, q1x, q1y, p2x, p2y)
+    o2 = orientation_filter(p1x, p1y, q1x, q1y, q2x, q2y)
+    o3 = orientation_filter(p2x, p2y, q2x, q2y, p1x, p1y)
+    o4 = orientation_filter(p2x, p2y, q2x, q2y, q1x, q1y)
+
+    if o1 == -1 or o2 == -1 or o3 == -1 or o4 == -1:
+        return -1
+
+    return 1 if o1 != o2 and o3 != o4 else 0
+
+
 def check_segment_segment_intersection(p1, q1, p2, q2):
     """
     Determines whether line segments p1q1 and p2q2 intersect.
     Source: https://www.geeksforgeeks.org/check-if-two-given-line-segments-intersect/
     """
+    # Use the floating-point filter and only check the intersection exactly if it is uncertain
+    intersect = segment_segment_intersection_filter(float(p1.x), float(p1.y), float(q1.x), float(q1.y),
+                                                    float(p2.x), float(p2.y), float(q2.x), float(q2.y))
+    if intersect != -1:
+        return intersect == 1
+
     # Find the four orientations required for the general and special cases
     o1 = orientation(p1, q1, p2)
     o2 = orientation(p1, q1, q2)